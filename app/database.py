@@ -1,6 +1,10 @@
 # 🛠️ Importa os módulos fundamentais do SQLModel
 # 🛠️ Import core modules from SQLModel
 from sqlmodel import create_engine, SQLModel, Session
+from sqlalchemy import event, MetaData
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.orm import sessionmaker
+import os
 
 # 📦 Importa Generator para tipar corretamente a função get_session
 # 📦 Import Generator to properly type the get_session function
@@ -15,8 +19,37 @@ DATABASE_URL = "sqlite:///./soda_machine.db"
 # ⚙️ Create the database connection engine
 engine = create_engine(
     DATABASE_URL,
-    echo=True  # Mostra todas as queries SQL no console (modo debug)
-    # Shows all SQL queries in console (debug mode)
+    echo=os.getenv("SQL_ECHO", "0") == "1",  # Mostra as queries SQL no console apenas se SQL_ECHO=1 (modo debug)
+    # Shows SQL queries in console only when SQL_ECHO=1 (debug mode)
+    pool_pre_ping=True,  # Valida a conexão antes de reutilizá-la do pool
+    # Validates the connection before reusing it from the pool
+    pool_size=5,
+    max_overflow=10,
+    pool_recycle=3600,  # Reaproveita conexões (e o cache de páginas do SQLite) entre requisições
+    # Reuses connections (and SQLite's page cache) across requests
+    connect_args={"check_same_thread": False}  # FastAPI usa várias threads / FastAPI uses multiple threads
+)
+
+# ⚡ Ajusta o SQLite a cada nova conexão (WAL permite leituras concorrentes com escritas)
+# ⚡ Tune SQLite on every new connection (WAL lets reads run concurrently with writes)
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")  # Sem fsync a cada commit no modo WAL / No fsync per commit under WAL
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")  # ~64 MB de cache de páginas / ~64 MB page cache
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB de I/O mapeado em memória / 256 MB memory-mapped I/O
+    cursor.close()
+
+# 🏭 Fábrica de sessões configurada uma única vez e reutilizada em toda a aplicação
+# 🏭 Session factory configured once and reused across the whole application
+SessionLocal = sessionmaker(
+    bind=engine,
+    class_=Session,
+    autoflush=False,
+    expire_on_commit=False  # Evita um novo SELECT ao acessar objetos após o commit
+    # Avoids a re-SELECT when accessing objects after commit
 )
 
 # ---------------------------------------------------------------------
@@ -26,6 +59,40 @@ def create_db_and_tables():
     """Cria todas as tabelas definidas nos modelos SQLModel.
     Create all tables defined in SQLModel schemas."""
     SQLModel.metadata.create_all(engine)
+    _add_product_stock_check()
+
+# ---------------------------------------------------------------------
+# 🛡️ Migração única: bancos criados antes do CHECK (stock >= 0) não o recebem via create_all,
+#    e o SQLite não permite adicionar CHECK com ALTER TABLE. A tabela é recriada com a
+#    restrição e os dados copiados, tudo numa única transação.
+# 🛡️ One-off migration: databases created before the CHECK (stock >= 0) don't get it from
+#    create_all, and SQLite can't add a CHECK with ALTER TABLE. The table is rebuilt with the
+#    constraint and the data copied over, all in a single transaction.
+def _add_product_stock_check():
+    """Recria a tabela product com o CHECK de estoque, se ainda não o tiver.
+    Rebuild the product table with the stock CHECK if it doesn't have it yet."""
+    table = SQLModel.metadata.tables.get("product")
+    if table is None:
+        return
+
+    with engine.connect() as connection:
+        current_ddl = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'product'"
+        ).scalar()
+        if current_ddl is None or "ck_product_stock_non_negative" in current_ddl:
+            return
+
+        # 🔄 Cria product_new, copia os dados, troca as tabelas e recria os índices
+        # 🔄 Create product_new, copy the data, swap the tables and recreate the indexes
+        columns = ", ".join(column.name for column in table.columns)
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        connection.execute(CreateTable(table.to_metadata(MetaData(), name="product_new")))
+        connection.exec_driver_sql(f"INSERT INTO product_new ({columns}) SELECT {columns} FROM product")
+        connection.exec_driver_sql("DROP TABLE product")
+        connection.exec_driver_sql("ALTER TABLE product_new RENAME TO product")
+        for index in table.indexes:
+            index.create(connection)
+        connection.commit()
 
 # ---------------------------------------------------------------------
 # 🔁 Gera uma sessão de banco para ser usada nos endpoints do FastAPI
@@ -33,5 +100,8 @@ def create_db_and_tables():
 def get_session() -> Generator[Session, None, None]:
     """Dependência para o FastAPI fornecer uma sessão de banco de dados.
     Dependency for FastAPI to provide a database session."""
-    with Session(engine) as session:
-        yield session
\ No newline at end of file
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
\ No newline at end of file
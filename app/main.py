@@ -1,11 +1,21 @@
 # 🌐 Importação dos módulos essenciais da API
 # 🌐 Import essential API modules
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse
+from fastapi.staticfiles import StaticFiles
 from sqlmodel import Session, select
+from sqlalchemy import insert, update
+from sqlalchemy.orm.attributes import set_committed_value
 from pydantic import BaseModel, Field
+from functools import lru_cache
+from typing import Optional
+import asyncio
+import hashlib
+import logging
 import os
 from dotenv import load_dotenv
+from rapidfuzz import process, fuzz, utils
 
 # 🔐 Carrega variáveis de ambiente do arquivo .env (ex: chave da IA)
 # 🔐 Load environment variables from .env (e.g. AI API key)
@@ -13,7 +23,7 @@ load_dotenv()
 
 # 📦 Importação dos módulos internos do projeto
 # 📦 Import internal project modules
-from .database import create_db_and_tables, get_session, engine
+from .database import create_db_and_tables, get_session, SessionLocal
 from .models import Product, Transaction
 from .services.ai_parser import parse_user_message, UserIntent, PurchaseIntent, UnknownIntent
 
@@ -25,22 +35,139 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# 🗂️ Arquivos estáticos (HTML da interface e futuros assets) servidos em /static
+# 🗂️ Static files (interface HTML and future assets) served under /static
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+
+# 📄 HTML da interface carregado uma única vez na inicialização do módulo
+# 📄 Interface HTML loaded once at module import
+with open(os.path.join(STATIC_DIR, "interface.html"), "rb") as html_file:
+    _INTERFACE_HTML = html_file.read()
+_INTERFACE_ETAG = f'"{hashlib.sha1(_INTERFACE_HTML).hexdigest()}"'
+_INTERFACE_HEADERS = {"Cache-Control": "public, max-age=3600, immutable", "ETag": _INTERFACE_ETAG}
+
 # 🧱 Evento executado na inicialização da API
 # 🧱 Event executed on API startup
 @app.on_event("startup")
 def startup():
     create_db_and_tables()
-    with Session(engine) as session:
+    with SessionLocal() as session:
         # 🔍 Se ainda não houver produtos, adiciona os iniciais
         # 🔍 If no products exist yet, add initial items
         if not session.exec(select(Product)).first():
-            session.add_all([
-                Product(name="Coca-Cola", price=2.50, stock=100),
-                Product(name="Pepsi", price=2.20, stock=80),
-                Product(name="Guaraná", price=2.00, stock=120)
-            ])
+            # 📦 Um único INSERT com várias linhas / A single multi-row INSERT
+            session.exec(insert(Product).values([
+                {"name": "Coca-Cola", "price": 2.50, "stock": 100},
+                {"name": "Pepsi", "price": 2.20, "stock": 80},
+                {"name": "Guaraná", "price": 2.00, "stock": 120}
+            ]))
             session.commit()
 
+    # 🔥 Carrega o catálogo de produtos em memória antes da primeira requisição
+    # 🔥 Load the product catalog into memory before the first request
+    _catalog.cache_clear()
+    _product_id_by_name.cache_clear()
+    _catalog()
+
+# 📬 Fila de transações aguardando gravação em lote por uma tarefa em segundo plano.
+#    A fila e a tarefa são criadas na inicialização, presas ao event loop que está rodando.
+# 📬 Queue of transactions waiting to be batch-written by a background task.
+#    The queue and the task are created on startup, bound to the running event loop.
+_TRANSACTION_BATCH_SIZE = int(os.getenv("TRANSACTION_BATCH_SIZE", "64"))
+_TRANSACTION_FLUSH_INTERVAL = float(os.getenv("TRANSACTION_FLUSH_INTERVAL", "0.05"))  # segundos / seconds
+_TRANSACTION_RETRY_DELAY = 1.0  # segundos entre tentativas após uma falha / seconds between retries after a failure
+_TRANSACTION_MAX_SHUTDOWN_ATTEMPTS = 3
+_transaction_loop: Optional[asyncio.AbstractEventLoop] = None
+_transaction_queue: Optional[asyncio.Queue] = None
+_transaction_flusher: Optional[asyncio.Task] = None
+
+# 💾 Grava um lote de transações com um único INSERT (executemany) e um único commit
+# 💾 Write a batch of transactions with a single INSERT (executemany) and a single commit
+def _write_transactions(rows: list[dict]) -> None:
+    with SessionLocal() as session:
+        session.exec(insert(Transaction), params=rows)
+        session.commit()
+
+# 📮 Enfileira uma transação (seguro a partir de qualquer thread); sem a tarefa rodando, grava na hora
+# 📮 Queue a transaction (safe from any thread); without the task running, write it right away
+def _enqueue_transaction(row: dict) -> None:
+    if _transaction_queue is None:
+        _write_transactions([row])
+        return
+    _transaction_loop.call_soon_threadsafe(_transaction_queue.put_nowait, row)
+
+# 📥 Junta na lista as transações da fila por alguns milissegundos (ou até encher o lote).
+#    Se já houver linhas pendentes de uma falha, não espera novas chegarem.
+#    Retorna True quando encontra o item None que sinaliza o encerramento.
+# 📥 Collect queued transactions into the list for a few milliseconds (or until the batch is full).
+#    If rows are already pending from a failure, it doesn't wait for new ones to arrive.
+#    Returns True when it meets the None item that signals shutdown.
+async def _collect_transactions(queue: asyncio.Queue, rows: list[dict]) -> bool:
+    limit = len(rows) + _TRANSACTION_BATCH_SIZE
+    if not rows:
+        row = await queue.get()
+        if row is None:
+            return True
+        rows.append(row)
+    while len(rows) < limit:
+        if queue.empty():
+            await asyncio.sleep(_TRANSACTION_FLUSH_INTERVAL)
+            if queue.empty():
+                break
+        row = queue.get_nowait()
+        if row is None:
+            return True
+        rows.append(row)
+    return False
+
+# 🔁 Grava as transações em lote. Um lote que falha continua pendente e é tentado de novo;
+#    no encerramento, depois de várias falhas, as linhas são registradas no log para recuperação.
+# 🔁 Batch-write transactions. A failed batch stays pending and is retried;
+#    on shutdown, after several failures, the rows are logged so they can be recovered.
+async def _flush_transactions(queue: asyncio.Queue) -> None:
+    logger = logging.getLogger(__name__)
+    rows: list[dict] = []
+    stopping = False
+    failures = 0
+    while True:
+        if not stopping:
+            stopping = await _collect_transactions(queue, rows)
+        if rows:
+            try:
+                await run_in_threadpool(_write_transactions, rows)
+            except Exception:
+                failures += 1
+                logger.exception("Falha ao gravar transações / Failed to write transactions")
+                if stopping and failures >= _TRANSACTION_MAX_SHUTDOWN_ATTEMPTS:
+                    logger.error("Transações não gravadas / Unwritten transactions: %r", rows)
+                    return
+                await asyncio.sleep(_TRANSACTION_RETRY_DELAY)
+                continue
+            rows = []
+            failures = 0
+        if stopping:
+            return
+
+# ▶️ Cria a fila e inicia a tarefa que grava as transações em lote
+# ▶️ Create the queue and start the task that batch-writes transactions
+@app.on_event("startup")
+async def start_transaction_flusher():
+    global _transaction_loop, _transaction_queue, _transaction_flusher
+    _transaction_loop = asyncio.get_running_loop()
+    _transaction_queue = asyncio.Queue()
+    _transaction_flusher = asyncio.create_task(_flush_transactions(_transaction_queue))
+
+# ⏹️ No encerramento, grava o que ainda estiver na fila antes de sair
+# ⏹️ On shutdown, write whatever is still queued before exiting
+@app.on_event("shutdown")
+async def stop_transaction_flusher():
+    global _transaction_loop, _transaction_queue, _transaction_flusher
+    if _transaction_flusher is not None:
+        await _transaction_queue.put(None)
+        await _transaction_flusher
+    _transaction_loop = _transaction_queue = _transaction_flusher = None
+
 # 🏠 Endpoint raiz: exibe mensagem de boas-vindas na API
 # 🏠 Root endpoint: displays welcome message in the API
 @app.get("/", tags=["Sistema"])
@@ -48,65 +175,97 @@ def root():
     return {"message": "Bem-vindo à HappyLoop Soda Machine API! Acesse /docs para a documentação interativa."}
 
 # 💬 Interface visual HTML para interação via navegador
+#    (lida do disco uma única vez e servida com cache no navegador)
 # 💬 HTML visual interface for browser interaction
+#    (read from disk once and served with browser caching)
 @app.get("/interface", response_class=HTMLResponse, tags=["Interface"])
-def interface():
-    return """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <title>🧃 HappyLoop Interação</title>
-    </head>
-    <body style='font-family:sans-serif; max-width:600px; margin:auto; padding:2rem;'>
-        <h1>🧃 HappyLoop Soda Machine</h1>
-        <p>Digite sua mensagem em linguagem natural (ex: "Quero comprar 3 Coca-Cola"):</p>
-        <input type="text" id="msg" placeholder="Ex: Quero comprar 2 Guaraná" style="width:100%; padding:8px;" />
-        <button onclick="enviar()" style="margin-top:10px; padding:8px 16px;">🛒 Enviar</button>
-        <pre id="resposta" style="background:#f4f4f4; padding:1rem; margin-top:2rem;"></pre>
-        <script>
-            // 📨 Envia a mensagem como JSON para o backend
-            // 📨 Sends the message as JSON to the backend
-            async function enviar() {
-                const msg = document.getElementById("msg").value;
-                const res = document.getElementById("resposta");
-                const r = await fetch("/interact/", {
-                    method: "POST",
-                    headers: { "Content-Type": "application/json" },
-                    body: JSON.stringify({ message: msg })
-                });
-                const data = await r.json();
-                res.textContent = JSON.stringify(data, null, 2);
-            }
-        </script>
-        <hr/>
-        <a href="/docs" target="_blank">🔍 Ver documentação Swagger</a>
-    </body>
-    </html>
-    """
+def interface(request: Request):
+    if request.headers.get("if-none-match") == _INTERFACE_ETAG:
+        return Response(status_code=304, headers=_INTERFACE_HEADERS)
+    return Response(_INTERFACE_HTML, media_type="text/html", headers=_INTERFACE_HEADERS)
 
 # 🧃 Endpoint para listar todos os produtos cadastrados
 # 🧃 Endpoint to list all registered products
+# (linhas lidas direto como mapeamentos, sem montar objetos ORM; o response_model deixa o
+#  FastAPI serializar direto para bytes JSON via Pydantic)
+# (rows read straight as mappings, without building ORM objects; the response_model lets
+#  FastAPI serialize straight to JSON bytes via Pydantic)
 @app.get("/products/", response_model=list[Product], tags=["Produtos"])
 def list_products(session: Session = Depends(get_session)):
-    return session.exec(select(Product)).all()
+    return session.exec(select(*Product.__table__.columns)).mappings().all()
 
 # 🧾 Endpoint para listar todas as transações realizadas
 # 🧾 Endpoint to list all recorded transactions
 @app.get("/transactions/", response_model=list[Transaction], tags=["Transações"])
 def list_transactions(session: Session = Depends(get_session)):
-    return session.exec(select(Transaction)).all()
+    return session.exec(select(*Transaction.__table__.columns)).mappings().all()
 
 # 📥 Modelo de entrada contendo a mensagem do usuário
 # 📥 Input model containing the user's message
 class UserInputMessage(BaseModel):
     message: str = Field(..., example="Quero comprar 3 Coca-Cola")
 
+# 📋 Catálogo em memória: nome normalizado (minúsculo, sem pontuação) -> ID, carregado numa
+#    única query e aquecido na inicialização (o catálogo é pequeno e os nomes não mudam)
+# 📋 In-memory catalog: normalized name (lowercase, no punctuation) -> ID, loaded in a single
+#    query and warmed up on startup (the catalog is small and names don't change)
+@lru_cache(maxsize=1)
+def _catalog() -> dict[str, int]:
+    with SessionLocal() as session:
+        rows = session.exec(select(Product.id, Product.name)).all()
+    return {utils.default_process(row.name): row.id for row in rows}
+
+# 🔢 Maior valor aceito por uma coluna INTEGER do SQLite (inteiro de 64 bits com sinal)
+# 🔢 Largest value accepted by an SQLite INTEGER column (signed 64-bit integer)
+_SQLITE_MAX_INTEGER = 2**63 - 1
+
+# 🔤 Tamanho mínimo para aceitar um nome parcial de produto
+# 🔤 Minimum length to accept a partial product name
+_MIN_PARTIAL_NAME_LENGTH = 3
+
+# 🗃️ Cache em memória: nome digitado pelo usuário -> ID do produto
+# 🗃️ In-memory cache: name typed by the user -> product ID
+@lru_cache(maxsize=int(os.getenv("PRODUCT_CACHE_SIZE", "128")))
+def _product_id_by_name(name: str) -> Optional[int]:
+    catalog = _catalog()
+    key = utils.default_process(name)
+
+    # 🔍 Procura pelo nome exato (ignorando maiúsculas e pontuação: "coca cola" == "Coca-Cola")
+    # 🔍 Look up the exact name (ignoring case and punctuation: "coca cola" == "Coca-Cola")
+    product_id = catalog.get(key)
+    if product_id is not None:
+        return product_id
+
+    # 🧩 Nome parcial: aceita se o texto estiver contido em exatamente um produto ("coca" -> "Coca-Cola").
+    #    Textos muito curtos ("co", "ca") e ambíguos não contam.
+    # 🧩 Partial name: accept it if the text is contained in exactly one product ("coca" -> "Coca-Cola").
+    #    Very short ("co", "ca") and ambiguous texts don't count.
+    if len(key) >= _MIN_PARTIAL_NAME_LENGTH:
+        candidates = [product_id for product_name, product_id in catalog.items() if key in product_name]
+        if len(candidates) == 1:
+            return candidates[0]
+
+    # 🔄 Por fim, aceita apenas um nome quase igual (erros de digitação, acentos).
+    #    Nada de pontuação parcial: "água" não pode virar "Guaraná", nem "Pepsi-Zero" virar "Pepsi".
+    #    As chaves do catálogo já estão normalizadas, então não há processor por chamada.
+    # 🔄 Finally, only accept a nearly identical name (typos, accents).
+    #    No partial scoring: "água" must not become "Guaraná", nor "Pepsi-Zero" become "Pepsi".
+    #    Catalog keys are already normalized, so there is no per-call processor.
+    hit = process.extractOne(key, catalog.keys(), scorer=fuzz.ratio, score_cutoff=85)
+    return catalog[hit[0]] if hit else None
+
+# ✅ Indica se o nome corresponde a algum produto do catálogo (usado pelo atalho local do ai_parser)
+# ✅ Tells whether the name matches a catalog product (used by ai_parser's local shortcut)
+def _is_known_product(name: str) -> bool:
+    return _product_id_by_name(name.strip()) is not None
+
 # 🧠 Endpoint principal que interpreta a mensagem e executa a compra
 # 🧠 Main endpoint that interprets the message and executes the purchase
 @app.post("/interact/", tags=["Interações"])
 def interact(user_input: UserInputMessage, session: Session = Depends(get_session)):
-    intent = parse_user_message(user_input.message)
+    # 🧵 Endpoint síncrono: o FastAPI roda tudo no threadpool (IA e banco), sem travar o event loop
+    # 🧵 Sync endpoint: FastAPI runs all of it in the threadpool (AI and database), never blocking the event loop
+    intent = parse_user_message(user_input.message, is_known_product=_is_known_product)
 
     # 🛒 Se a IA identificar intenção de compra, processa o pedido
     # 🛒 If AI identifies a purchase intent, process the request
@@ -119,34 +278,52 @@ def interact(user_input: UserInputMessage, session: Session = Depends(get_sessio
         if quantity <= 0:
             raise HTTPException(status_code=400, detail="A quantidade deve ser positiva.")
 
-        # 🔍 Procura pelo produto no banco de dados (case-insensitive)
-        # 🔍 Look up product in the database (case-insensitive)
-        product = session.exec(select(Product).where(Product.name.ilike(name))).first()
-
-        # 🔄 Se não encontrar exatamente, tenta por similaridade
-        # 🔄 If exact match not found, try similarity search
+        # 🔍 Resolve o nome para o ID do produto (em cache) e carrega pela chave primária
+        # 🔍 Resolve the name to the product ID (cached) and load it by primary key
+        product_id = _product_id_by_name(name)
+        product = session.get(Product, product_id) if product_id is not None else None
         if not product:
-            for p_name in session.exec(select(Product.name)).all():
-                if name.lower() in p_name.lower():
-                    product = session.exec(select(Product).where(Product.name == p_name)).first()
-                    break
-            if not product:
-                raise HTTPException(status_code=404, detail=f"Produto '{name}' não encontrado.")
-
-        # 📉 Verifica se há estoque suficiente
-        # 📉 Check if there's enough stock
-        if product.stock < quantity:
+            session.rollback()
+            raise HTTPException(status_code=404, detail=f"Produto '{name}' não encontrado.")
+
+        # 🚫 Quantidades acima do maior INTEGER do SQLite nunca cabem no estoque (e nem podem ir para o UPDATE)
+        # 🚫 Quantities above SQLite's largest INTEGER never fit the stock (and can't be bound in the UPDATE)
+        if quantity > _SQLITE_MAX_INTEGER:
+            session.rollback()
             raise HTTPException(status_code=400, detail=f"Estoque insuficiente. Disponível: {product.stock}")
 
-        # ✍️ Atualiza o estoque e registra a transação
-        # ✍️ Update stock and record the transaction
-        product.stock -= quantity
-        total = product.price * quantity
-        transaction = Transaction(product_id=product.id, quantity=quantity, total_price=total)
+        # 🔒 Só agora abre a transação de escrita, já com o lock (evita SQLITE_BUSY ao promover o lock depois)
+        # 🔒 Only now open the write transaction, holding the lock (avoids SQLITE_BUSY on a later lock upgrade)
+        session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+        # 📉 Baixa o estoque de forma atômica: o UPDATE só acontece se houver estoque suficiente
+        #    e devolve o estoque restante (RETURNING), sem outro SELECT
+        # 📉 Decrement stock atomically: the UPDATE only applies if there's enough stock
+        #    and returns the remaining stock (RETURNING), without another SELECT
+        remaining = session.exec(
+            update(Product)
+            .where(Product.id == product.id, Product.stock >= quantity)
+            .values(stock=Product.stock - quantity)
+            .returning(Product.stock)
+            .execution_options(synchronize_session=False)
+        ).scalar_one_or_none()
+        if remaining is None:
+            session.refresh(product)
+            available = product.stock
+            session.rollback()
+            raise HTTPException(status_code=400, detail=f"Estoque insuficiente. Disponível: {available}")
 
-        session.add_all([product, transaction])
+        set_committed_value(product, "stock", remaining)
         session.commit()
 
+        # ✍️ Enfileira a transação; ela é gravada em lote pela tarefa em segundo plano
+        #    (por isso o ID ainda não existe na resposta)
+        # ✍️ Queue the transaction; it is batch-written by the background task
+        #    (so its ID does not exist yet in the response)
+        total = product.price * quantity
+        transaction = Transaction(product_id=product.id, quantity=quantity, total_price=total)
+        _enqueue_transaction(transaction.model_dump(exclude={"id"}))
+
         # ✅ Retorna os dados da compra concluída
         # ✅ Return data for the successful purchase
         return {
@@ -2,11 +2,16 @@
 # 🔧 Optional types and dynamic relationships
 from typing import Optional
 from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import CheckConstraint
 from datetime import datetime
 
 # 🧃 Modelo que representa um produto (refrigerante) disponível para venda
 # 🧃 Model representing a soda product available for sale
 class Product(SQLModel, table=True):
+    # 🛡️ O próprio banco impede estoque negativo, mesmo fora da API
+    # 🛡️ The database itself rejects negative stock, even outside the API
+    __table_args__ = (CheckConstraint("stock >= 0", name="ck_product_stock_non_negative"),)
+
     # 🆔 Identificador único do produto (gerado automaticamente)
     # 🆔 Unique product ID (automatically generated)
     id: Optional[int] = Field(default=None, primary_key=True)
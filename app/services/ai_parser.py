@@ -1,16 +1,17 @@
 # 📦 Importações padrão para manipulação de ambiente e dados
 # 📦 Standard imports for environment and data handling
 import os
-import json
+import orjson
 import re
+from functools import lru_cache
 
 # 🔍 Validação de dados com Pydantic
 # 🔍 Data validation with Pydantic
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 
 # 🧠 Tipagem dinâmica e composição de tipos
 # 🧠 Dynamic typing and type composition
-from typing import Optional, Union
+from typing import Callable, Optional, Union
 
 # 🤖 Integração com a API da Gemini (IA generativa do Google)
 # 🤖 Integration with Gemini API (Google's generative AI)
@@ -24,6 +25,46 @@ genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 # 🧠 Create an instance of the desired generative model
 model = genai.GenerativeModel("gemini-2.0-flash")  # ou "gemini-1.5-pro" / or "gemini-1.5-pro"
 
+# 📝 Instruções enviadas à IA (montadas uma única vez; só a frase muda a cada chamada)
+# 📝 Prompt sent to the AI (built once; only the sentence changes per call)
+_PROMPT_TEMPLATE = """
+Você é o assistente de uma máquina de refrigerantes.
+Interprete a frase do usuário e retorne APENAS um JSON.
+
+✅ Se for uma compra:
+{{
+  "type": "purchase",
+  "data": {{
+    "product_name": "Coca-Cola",
+    "quantity": 3
+  }}
+}}
+
+❌ Se a frase for ambígua ou incompleta:
+{{
+  "type": "unknown",
+  "data": {{
+    "reason": "Texto ambíguo ou incompleto"
+  }}
+}}
+
+Frase: "{message}"
+"""
+
+# ⚡ Atalho local para frases simples de compra ("Quero 3 Coca-Cola"), sem chamar a IA.
+#    Só aceita a frase inteira com um nome de uma palavra e até 6 dígitos; o resto segue para a Gemini.
+# ⚡ Local shortcut for simple purchase sentences ("Quero 3 Coca-Cola"), without calling the AI.
+#    Only the whole sentence with a one-word name and up to 6 digits is accepted; everything else goes to Gemini.
+_FAST_PURCHASE_RE = re.compile(
+    r"^\s*(?:quero(?:\s+comprar)?|comprar|compre|dame|me\s+d[êe])\s+(\d{1,6})\s+(?:x\s+)?"
+    r"([A-Za-zÀ-ÿ][A-Za-zÀ-ÿ\-]{1,30})\s*[.!]?\s*$",
+    re.IGNORECASE,
+)
+
+# 🕵️‍♂️ Expressão regular (pré-compilada) que extrai o JSON da resposta da IA
+# 🕵️‍♂️ Precompiled regex that extracts the JSON from the AI response
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
 # ------------------------------------------------------------------
 # 📄 Modelos Pydantic para representar a intenção do usuário
 # 📄 Pydantic schemas to represent user intent
@@ -50,51 +91,56 @@ class UserIntent(BaseModel):
 
     # 📦 Dados relacionados à intenção (modelo dependente)
     # 📦 Related intent data (dependent schema)
-    data: Optional[Union[PurchaseIntent, UnknownIntent]] = Field(description="Dados associados à intenção.")
+    # ➡️ Tenta os modelos em ordem (compra primeiro) em vez de validar todos e escolher o melhor
+    # ➡️ Tries the schemas in order (purchase first) instead of validating all and picking the best
+    data: Optional[Union[PurchaseIntent, UnknownIntent]] = Field(
+        description="Dados associados à intenção.",
+        union_mode="left_to_right"
+    )
+
+# ⚙️ Validador compilado uma única vez e reutilizado a cada resposta da IA
+# ⚙️ Validator compiled once and reused for every AI response
+_USER_INTENT_ADAPTER = TypeAdapter(UserIntent)
 
 # ------------------------------------------------------------------
 # 🔍 Função principal que interpreta a frase do usuário com IA
 # 🔍 Main function that interprets user's sentence using AI
 # ------------------------------------------------------------------
 
-def parse_user_message(message: str) -> UserIntent:
-    try:
-        # 🧠 Envia instruções para o modelo generativo interpretar a frase
-        # 🧠 Send prompt to generative model to interpret the sentence
-        response = model.generate_content(
-            f"""
-            Você é o assistente de uma máquina de refrigerantes.
-            Interprete a frase do usuário e retorne APENAS um JSON.
-
-            ✅ Se for uma compra:
-            {{
-              "type": "purchase",
-              "data": {{
-                "product_name": "Coca-Cola",
-                "quantity": 3
-              }}
-            }}
-
-            ❌ Se a frase for ambígua ou incompleta:
-            {{
-              "type": "unknown",
-              "data": {{
-                "reason": "Texto ambíguo ou incompleto"
-              }}
-            }}
-
-            Frase: "{message}"
-            """
+# ♻️ Frases repetidas reutilizam a resposta anterior sem chamar a Gemini novamente.
+#    Erros não são guardados em cache (exceções não entram no lru_cache).
+# ♻️ Repeated sentences reuse the previous answer without calling Gemini again.
+#    Errors are not cached (exceptions never enter the lru_cache).
+@lru_cache(maxsize=int(os.getenv("INTENT_CACHE_SIZE", "1024")))
+def _interpret_message(message: str) -> UserIntent:
+    # 🧠 Envia instruções para o modelo generativo interpretar a frase
+    # 🧠 Send prompt to generative model to interpret the sentence
+    response = model.generate_content(_PROMPT_TEMPLATE.format(message=message))
+
+    # 🕵️‍♂️ Extrai o JSON da resposta textual usando expressão regular
+    # 🕵️‍♂️ Extract JSON from the text response using regex
+    text = response.text
+    match = _JSON_RE.search(text) if "{" in text else None
+    parsed_json = orjson.loads(match.group()) if match else {}
+
+    # 🔄 Converte o JSON em uma instância Pydantic
+    # 🔄 Convert JSON into Pydantic instance
+    return _USER_INTENT_ADAPTER.validate_python(parsed_json)
+
+def parse_user_message(message: str, is_known_product: Optional[Callable[[str], bool]] = None) -> UserIntent:
+    # ⚡ Frases simples de compra são interpretadas localmente, mas só se o nome existir no catálogo;
+    #    caso contrário ("Quero 2 cocas") a Gemini continua responsável por entender o produto
+    # ⚡ Simple purchase sentences are interpreted locally, but only if the name is in the catalog;
+    #    otherwise ("Quero 2 cocas") Gemini is still in charge of understanding the product
+    fast_match = _FAST_PURCHASE_RE.match(message)
+    if fast_match and is_known_product is not None and is_known_product(fast_match.group(2)):
+        return UserIntent(
+            type="purchase",
+            data=PurchaseIntent(product_name=fast_match.group(2), quantity=int(fast_match.group(1)))
         )
 
-        # 🕵️‍♂️ Extrai o JSON da resposta textual usando expressão regular
-        # 🕵️‍♂️ Extract JSON from the text response using regex
-        match = re.search(r"\{.*\}", response.text, re.DOTALL)
-        parsed_json = json.loads(match.group()) if match else {}
-
-        # 🔄 Converte o JSON em uma instância Pydantic
-        # 🔄 Convert JSON into Pydantic instance
-        return UserIntent(**parsed_json)
+    try:
+        return _interpret_message(message)
 
     # ⚠️ Caso a estrutura do JSON seja inválida, retorna como "unknown"
     # ⚠️ If JSON structure is invalid, return as "unknown"